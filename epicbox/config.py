@@ -33,6 +33,9 @@ CPU_TO_REAL_TIME_FACTOR = 5
 
 
 class Profile(object):
+    __slots__ = ('name', 'docker_image', 'command', 'user', 'read_only',
+                 'network_disabled')
+
     def __init__(self, name, docker_image, command=None, user=DEFAULT_USER,
                  read_only=False, network_disabled=True):
         self.name = name
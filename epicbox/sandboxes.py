@@ -2,6 +2,7 @@ import io
 import tarfile
 import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 
 import structlog
@@ -10,7 +11,8 @@ from requests.exceptions import RequestException
 
 from . import config, exceptions, utils
 
-__all__ = ['create', 'start', 'destroy', 'run', 'working_directory']
+__all__ = ['create', 'start', 'destroy', 'run', 'run_many',
+           'working_directory']
 
 logger = structlog.get_logger()
 
@@ -24,6 +26,8 @@ class Sandbox:
     completion of the block.
     """
 
+    __slots__ = ('id_', 'container', 'realtime_limit')
+
     def __init__(self, id_, container, realtime_limit=None):
         self.id_ = id_
         self.container = container
@@ -57,13 +61,13 @@ def create(profile_name, command=None, files=None, limits=None, workdir=None):
     :raises DockerError: If an error occurred with the underlying
                          docker system.
     """
-    if profile_name not in config.PROFILES:
+    profile = config.PROFILES.get(profile_name)
+    if profile is None:
         raise ValueError("Profile not found: {0}".format(profile_name))
     if workdir is not None and not isinstance(workdir, _WorkingDirectory):
         raise ValueError("Invalid 'workdir', it should be created using "
                          "'working_directory' context manager")
-    sandbox_id = str(uuid.uuid4())
-    profile = config.PROFILES[profile_name]
+    sandbox_id = uuid.uuid4().hex
     command = command or profile.command or 'true'
     command_list = ['/bin/sh', '-c', command]
     limits = utils.merge_limits_defaults(limits)
@@ -83,7 +87,9 @@ def create(profile_name, command=None, files=None, limits=None, workdir=None):
     if files:
         _write_files(c, files)
     sandbox = Sandbox(sandbox_id, c, realtime_limit=limits['realtime'])
-    logger.info("Sandbox created and ready to start", sandbox=sandbox)
+    logger.info("Sandbox created and ready to start", sandbox=sandbox,
+                image=profile.docker_image, command=command, limits=limits,
+                workdir=workdir)
     return sandbox
 
 
@@ -107,9 +113,9 @@ def _create_sandbox_container(sandbox_id, image, command, limits, workdir=None,
 
     docker_client = utils.get_docker_client()
     log = logger.bind(sandbox_id=sandbox_id)
-    log.info("Creating a new sandbox container", name=name, image=image,
-             command=command, limits=limits, workdir=workdir, user=user,
-             read_only=read_only, network_disabled=network_disabled)
+    log.debug("Creating a new sandbox container", name=name, image=image,
+              command=command, limits=limits, workdir=workdir, user=user,
+              read_only=read_only, network_disabled=network_disabled)
     try:
         c = docker_client.containers.create(image,
                                             command=command,
@@ -136,9 +142,10 @@ def _create_sandbox_container(sandbox_id, image, command, limits, workdir=None,
                      name=name)
             c = {'Id': name}
         else:
-            log.exception("Failed to create a sandbox container")
+            log.exception("Failed to create a sandbox container", name=name,
+                          image=image)
             raise exceptions.DockerError(str(e))
-    log.info("Sandbox container created", container=c)
+    log.debug("Sandbox container created", container=c)
     return c
 
 
@@ -161,7 +168,7 @@ def start(sandbox, stdin=None):
         if isinstance(stdin, str):
             stdin = stdin.encode()
     log = logger.bind(sandbox=sandbox)
-    log.info("Starting the sandbox", stdin_size=len(stdin or ''))
+    log.debug("Starting the sandbox", stdin_size=len(stdin or ''))
     result = {
         'exit_code': None,
         'stdout': b'',
@@ -181,7 +188,7 @@ def start(sandbox, stdin=None):
         log.exception("Sandbox runtime error")
         raise exceptions.DockerError(str(e))
     else:
-        log.info("Sandbox container exited")
+        log.debug("Sandbox container exited")
         state = utils.inspect_exited_container_state(sandbox.container)
         result.update(stdout=stdout, stderr=stderr, **state)
         if (utils.is_killed_by_sigkill_or_sigxcpu(state['exit_code']) and
@@ -227,12 +234,36 @@ def run(profile_name, command=None, files=None, stdin=None, limits=None,
         return start(sandbox, stdin=stdin)
 
 
+def run_many(jobs, max_workers=8):
+    """Run several commands in new sandbox containers concurrently and wait
+    for all of them to finish running.
+
+    Sandboxes spend most of the time waiting for the Docker API, so they are
+    run by a pool of threads which share Docker client connections.
+
+    :param list jobs: A list of dicts with keyword arguments for `run`.
+    :param int max_workers: The maximum number of sandboxes running at the
+        same time.  Keep it within the Docker client connection pool size
+        (10 by default) to reuse connections.
+    :return list: A list of results in the same order as `jobs`, each
+        the same as for `start`.
+
+    :raises DockerError: If an error occurred with the underlying
+                         docker system.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(run, **job) for job in jobs]
+    return [future.result() for future in futures]
+
+
 class _WorkingDirectory(object):
     """Represent a Docker volume used as a working directory.
 
     Not intended to be instantiated by yourself.
     """
 
+    __slots__ = ('volume', 'node')
+
     def __init__(self, volume, node=None):
         self.volume = volume
         self.node = node
@@ -247,9 +278,9 @@ class _WorkingDirectory(object):
 @contextmanager
 def working_directory():
     docker_client = utils.get_docker_client()
-    volume_name = 'epicbox-' + str(uuid.uuid4())
+    volume_name = 'epicbox-' + uuid.uuid4().hex
     log = logger.bind(volume=volume_name)
-    log.info("Creating new docker volume for working directory")
+    log.debug("Creating new docker volume for working directory")
     try:
         volume = docker_client.volumes.create(volume_name)
     except (RequestException, DockerException) as e:
@@ -259,7 +290,7 @@ def working_directory():
     try:
         yield _WorkingDirectory(volume=volume_name, node=None)
     finally:  # Ensure that volume cleanup takes place
-        log.info("Removing the docker volume")
+        log.debug("Removing the docker volume")
         try:
             volume.remove()
         except NotFound:
@@ -276,8 +307,8 @@ def _write_files(container, files):
     # is called immediately after the container is created.
     # Retry on 500 Server Error when untar cannot allocate memory.
     docker_client = utils.get_docker_client(retry_status_forcelist=(404, 500))
-    log = logger.bind(files=utils.filter_filenames(files), container=container)
-    log.info("Writing files to the working directory in container")
+    log = logger.bind(container=container)
+    log.debug("Writing files to the working directory in container")
     mtime = int(time.time())
     files_written = []
     tarball_fileobj = io.BytesIO()
@@ -289,14 +320,32 @@ def _write_files(container, files):
             file_info = tarfile.TarInfo(name=file['name'])
             file_info.size = len(content)
             file_info.mtime = mtime
-            tarball.addfile(file_info, fileobj=io.BytesIO(content))
+            _add_tar_member(tarball, file_info, content)
             files_written.append(file['name'])
     try:
         docker_client.api.put_archive(container.id, config.DOCKER_WORKDIR,
                                       tarball_fileobj.getvalue())
     except (RequestException, DockerException) as e:
         log.exception("Failed to extract an archive of files to the working "
-                      "directory in container")
+                      "directory in container",
+                      files=utils.filter_filenames(files))
         raise exceptions.DockerError(str(e))
     log.info("Successfully written files to the working directory",
              files_written=files_written)
+
+
+def _add_tar_member(tarball, tarinfo, content):
+    """Write a member with in-memory `content` to the `tarball` opened for
+    writing.
+
+    Unlike `TarFile.addfile` it doesn't need a file object to copy the
+    content from, the content is written to the archive as is.
+    """
+    header = tarinfo.tobuf(tarball.format, tarball.encoding, tarball.errors)
+    tarball.fileobj.write(header)
+    tarball.fileobj.write(content)
+    blocks, remainder = divmod(len(content), tarfile.BLOCKSIZE)
+    if remainder:
+        tarball.fileobj.write(tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
+        blocks += 1
+    tarball.offset += len(header) + blocks * tarfile.BLOCKSIZE
@@ -1,15 +1,15 @@
+import datetime
 import errno
 import os
-import select
+import re
+import selectors
 import signal
 import socket
 import struct
 import time
 
-import dateutil.parser
 import docker
 import structlog
-from docker import constants as docker_consts
 from docker.errors import DockerException
 from docker.types import Ulimit
 from requests.adapters import HTTPAdapter
@@ -22,15 +22,36 @@ logger = structlog.get_logger()
 
 _DOCKER_CLIENTS = {}
 
+#: Output longer than this is truncated when a result is logged.
+_MAX_OUTPUT_LENGTH = 100
+_TRUNCATED_SUFFIX = b' *** truncated ***'
+
+#: Exit statuses of a process killed by SIGKILL or SIGXCPU.
+_KILLED_BY_SIGKILL_OR_SIGXCPU_STATUSES = frozenset(
+    (128 + signal.SIGKILL, 128 + signal.SIGXCPU))
+
 #: Recoverable IO/OS Errors.
 ERRNO_RECOVERABLE = (errno.EINTR, errno.EDEADLK, errno.EWOULDBLOCK)
 
+#: Header of a chunk in a multiplexed Docker stream: a stream type
+#: and a chunk length.
+_STREAM_HEADER = struct.Struct('>BxxxL')
+
+#: RFC 3339 timestamp with up to nanosecond precision, as used by Docker.
+_DOCKER_DATETIME_RE = re.compile(
+    r'^(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})(?:\.(\d+))?'
+    r'(Z|[+-]\d{2}:\d{2})$')
+
 
 def get_docker_client(base_url=None, retry_read=config.DOCKER_MAX_READ_RETRIES,
                       retry_status_forcelist=(500,)):
-    client_key = (retry_read, retry_status_forcelist)
-    if client_key not in _DOCKER_CLIENTS:
-        client = docker.DockerClient(base_url=base_url or config.DOCKER_URL,
+    base_url = base_url or config.DOCKER_URL
+    retry_status_forcelist = tuple(retry_status_forcelist)
+    # Clients are shared to reuse their keep-alive connection pools
+    client_key = (base_url, retry_read, retry_status_forcelist)
+    client = _DOCKER_CLIENTS.get(client_key)
+    if client is None:
+        client = docker.DockerClient(base_url=base_url,
                                      timeout=config.DOCKER_TIMEOUT)
         retries = Retry(total=config.DOCKER_MAX_TOTAL_RETRIES,
                         connect=config.DOCKER_MAX_CONNECT_RETRIES,
@@ -42,18 +63,21 @@ def get_docker_client(base_url=None, retry_read=config.DOCKER_MAX_READ_RETRIES,
         http_adapter = HTTPAdapter(max_retries=retries)
         client.api.mount('http://', http_adapter)
         _DOCKER_CLIENTS[client_key] = client
-    return _DOCKER_CLIENTS[client_key]
+    return client
 
 
 def inspect_container_node(container):
-    # 404 No such container may be returned when TimeoutError occurs
-    # on container creation.
-    docker_client = get_docker_client(retry_status_forcelist=(404, 500))
-    try:
-        container = docker_client.containers.get(container.id)
-    except (RequestException, DockerException) as e:
-        logger.exception("Failed to get the container", container=container)
-        raise exceptions.DockerError(str(e))
+    if 'State' not in container.attrs:
+        # The container was not inspected yet, e.g. it was only created.
+        # 404 No such container may be returned when TimeoutError occurs
+        # on container creation.
+        docker_client = get_docker_client(retry_status_forcelist=(404, 500))
+        try:
+            container = docker_client.containers.get(container.id)
+        except (RequestException, DockerException) as e:
+            logger.exception("Failed to get the container",
+                             container=container)
+            raise exceptions.DockerError(str(e))
     if 'Node' not in container.attrs:
         # Remote Docker side is not a Docker Swarm cluster
         return None
@@ -67,8 +91,9 @@ def inspect_exited_container_state(container):
         logger.exception("Failed to load the container from the Docker engine",
                          container=container)
         raise exceptions.DockerError(str(e))
-    started_at = dateutil.parser.parse(container.attrs['State']['StartedAt'])
-    finished_at = dateutil.parser.parse(container.attrs['State']['FinishedAt'])
+    started_at = parse_docker_datetime(container.attrs['State']['StartedAt'])
+    finished_at = parse_docker_datetime(
+        container.attrs['State']['FinishedAt'])
     duration = finished_at - started_at
     duration_seconds = duration.total_seconds()
     if duration_seconds < 0:
@@ -80,6 +105,33 @@ def inspect_exited_container_state(container):
     }
 
 
+def parse_docker_datetime(value):
+    """
+    Parse a timestamp returned by the Docker API.
+
+    Docker always uses the RFC 3339 format with nanosecond precision,
+    e.g. `2018-11-10T12:34:56.123456789Z`.  Fractional seconds are truncated
+    to microseconds.
+
+    :param str value: A timestamp string.
+    :return: An aware `datetime.datetime` object.
+    """
+    match = _DOCKER_DATETIME_RE.match(value)
+    if not match:
+        raise ValueError("Invalid Docker timestamp: {0!r}".format(value))
+    year, month, day, hour, minute, second, fraction, offset = match.groups()
+    microsecond = int(fraction[:6].ljust(6, '0')) if fraction else 0
+    if offset == 'Z':
+        tzinfo = datetime.timezone.utc
+    else:
+        sign = -1 if offset[0] == '-' else 1
+        tzinfo = datetime.timezone(sign * datetime.timedelta(
+            hours=int(offset[1:3]), minutes=int(offset[4:6])))
+    return datetime.datetime(int(year), int(month), int(day), int(hour),
+                             int(minute), int(second), microsecond,
+                             tzinfo=tzinfo)
+
+
 def demultiplex_docker_stream(data):
     """
     Demultiplex the raw docker stream into separate stdout and stderr streams.
@@ -100,24 +152,25 @@ def demultiplex_docker_stream(data):
     :param bytes data: A raw stream data.
     :return: A tuple `(stdout, stderr)` of bytes objects.
     """
+    # Slice a memoryview to avoid copying chunks before they are joined
+    view = memoryview(data)
     data_length = len(data)
     stdout_chunks = []
     stderr_chunks = []
     walker = 0
-    while data_length - walker >= 8:
-        header = data[walker:walker + docker_consts.STREAM_HEADER_SIZE_BYTES]
-        stream_type, length = struct.unpack_from('>BxxxL', header)
-        start = walker + docker_consts.STREAM_HEADER_SIZE_BYTES
+    while data_length - walker >= _STREAM_HEADER.size:
+        stream_type, length = _STREAM_HEADER.unpack_from(view, walker)
+        start = walker + _STREAM_HEADER.size
         end = start + length
         walker = end
         if stream_type == 1:
-            stdout_chunks.append(data[start:end])
+            stdout_chunks.append(view[start:end])
         elif stream_type == 2:
-            stderr_chunks.append(data[start:end])
+            stderr_chunks.append(view[start:end])
     return b''.join(stdout_chunks), b''.join(stderr_chunks)
 
 
-def _socket_read(sock, n=4096):
+def _socket_read(sock, n=65536):
     """
     Read at most `n` bytes of data from the `sock` socket.
 
@@ -183,59 +236,73 @@ def docker_communicate(container, stdin=None, start_container=True,
     }
     sock = docker_client.api.attach_socket(container.id, params=params)
     sock._sock.setblocking(False)  # Make socket non-blocking
-    log.info("Attached to the container", params=params, fd=sock.fileno(),
-             timeout=timeout)
+    log.debug("Attached to the container", params=params, fd=sock.fileno(),
+              timeout=timeout)
     if not stdin:
         log.debug("There is no input data. Shut down the write half "
                   "of the socket.")
         sock._sock.shutdown(socket.SHUT_WR)
     if start_container:
         container.start()
-        log.info("Container started")
-
-    stream_data = b''
-    start_time = time.time()
-    while timeout is None or time.time() - start_time < timeout:
-        read_ready, write_ready, _ = select.select([sock], [sock], [], 1)
-        is_io_active = False
-        if read_ready:
-            is_io_active = True
-            try:
-                data = _socket_read(sock)
-            except ConnectionResetError:
-                log.warning("Connection reset caught on reading the container "
-                            "output stream. Break communication")
-                break
-            if data is None:
-                log.debug("Container output reached EOF. Closing the socket")
-                break
-            stream_data += data
-
-        if write_ready and stdin:
-            is_io_active = True
-            try:
-                written = _socket_write(sock, stdin)
-            except BrokenPipeError:
-                # Broken pipe may happen when a container terminates quickly
-                # (e.g. OOM Killer) and docker manages to close the socket
-                # almost immediately before we're trying to write to stdin.
-                log.warning("Broken pipe caught on writing to stdin. Break "
-                            "communication")
-                break
-            stdin = stdin[written:]
-            if not stdin:
-                log.debug("All input data has been sent. Shut down the write "
-                          "half of the socket.")
-                sock._sock.shutdown(socket.SHUT_WR)
-
-        if not is_io_active:
-            # Save CPU time
-            time.sleep(0.05)
+        log.debug("Container started")
+
+    stream_chunks = []
+    selector = selectors.DefaultSelector()
+    # Wait for the socket to become writable only while there is input
+    # data to send, otherwise the selector would never block.
+    if stdin:
+        # Slicing a memoryview on partial writes doesn't copy the rest
+        # of the data
+        stdin = memoryview(stdin)
+        selector.register(sock, selectors.EVENT_READ | selectors.EVENT_WRITE)
     else:
+        selector.register(sock, selectors.EVENT_READ)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    try:
+        while deadline is None or time.monotonic() < deadline:
+            select_timeout = None
+            if deadline is not None:
+                select_timeout = deadline - time.monotonic()
+            ready = selector.select(select_timeout)
+            events = ready[0][1] if ready else 0
+            if events & selectors.EVENT_READ:
+                try:
+                    data = _socket_read(sock)
+                except ConnectionResetError:
+                    log.warning("Connection reset caught on reading the "
+                                "container output stream. Break "
+                                "communication")
+                    break
+                if data is None:
+                    log.debug("Container output reached EOF. Closing the "
+                              "socket")
+                    break
+                stream_chunks.append(data)
+
+            if events & selectors.EVENT_WRITE and stdin:
+                try:
+                    written = _socket_write(sock, stdin)
+                except BrokenPipeError:
+                    # Broken pipe may happen when a container terminates
+                    # quickly (e.g. OOM Killer) and docker manages to close
+                    # the socket almost immediately before we're trying to
+                    # write to stdin.
+                    log.warning("Broken pipe caught on writing to stdin. "
+                                "Break communication")
+                    break
+                stdin = stdin[written:]
+                if not stdin:
+                    log.debug("All input data has been sent. Shut down the "
+                              "write half of the socket.")
+                    sock._sock.shutdown(socket.SHUT_WR)
+                    selector.modify(sock, selectors.EVENT_READ)
+        else:
+            raise TimeoutError("Container didn't terminate after timeout "
+                               "seconds")
+    finally:
+        selector.close()
         sock.close()
-        raise TimeoutError("Container didn't terminate after timeout seconds")
-    sock.close()
-    return demultiplex_docker_stream(stream_data)
+    return demultiplex_docker_stream(b''.join(stream_chunks))
 
 
 def filter_filenames(files):
@@ -243,15 +310,16 @@ def filter_filenames(files):
 
 
 def merge_limits_defaults(limits):
+    """Return a new dict of the given limits completed with
+    `config.DEFAULT_LIMITS`.  The `limits` argument is left untouched.
+    """
     if not limits:
-        return config.DEFAULT_LIMITS
-    is_realtime_specified = 'realtime' in limits
-    for limit_name, default_value in config.DEFAULT_LIMITS.items():
-        if limit_name not in limits:
-            limits[limit_name] = default_value
-    if not is_realtime_specified:
-        limits['realtime'] = limits['cputime'] * config.CPU_TO_REAL_TIME_FACTOR
-    return limits
+        return dict(config.DEFAULT_LIMITS)
+    merged = dict(config.DEFAULT_LIMITS)
+    merged.update(limits)
+    if 'realtime' not in limits:
+        merged['realtime'] = merged['cputime'] * config.CPU_TO_REAL_TIME_FACTOR
+    return merged
 
 
 def create_ulimits(limits):
@@ -266,15 +334,19 @@ def create_ulimits(limits):
 
 
 def truncate_result(result):
-    MAX_OUTPUT_LENGTH = 100
-    truncated = {}
-    for k, v in result.items():
-        if k in ['stdout', 'stderr']:
-            if len(v) > MAX_OUTPUT_LENGTH:
-                v = v[:MAX_OUTPUT_LENGTH] + b' *** truncated ***'
-        truncated[k] = v
-    return truncated
+    """Return the result with stdout and stderr truncated for logging.
+
+    The result itself is returned if there is nothing to truncate.
+    """
+    truncated = None
+    for key in ('stdout', 'stderr'):
+        value = result.get(key)
+        if value is not None and len(value) > _MAX_OUTPUT_LENGTH:
+            if truncated is None:
+                truncated = dict(result)
+            truncated[key] = value[:_MAX_OUTPUT_LENGTH] + _TRUNCATED_SUFFIX
+    return result if truncated is None else truncated
 
 
 def is_killed_by_sigkill_or_sigxcpu(status):
-    return status - 128 in [signal.SIGKILL, signal.SIGXCPU]
+    return status in _KILLED_BY_SIGKILL_OR_SIGXCPU_STATUSES
@@ -1,3 +1,5 @@
+import io
+import tarfile
 import time
 import uuid
 from unittest.mock import ANY
@@ -7,7 +9,8 @@ import pytest
 
 from epicbox import config, utils
 from epicbox.exceptions import DockerError
-from epicbox.sandboxes import (create, destroy, run, start, working_directory,
+from epicbox.sandboxes import (create, destroy, run, run_many, start,
+                               working_directory, _add_tar_member,
                                _write_files)
 from .utils import is_docker_swarm, get_swarm_nodes
 
@@ -319,6 +322,29 @@ def test_run_read_stdin(profile):
     assert result['stdout'] == 'utf8 данные\n'.encode()
 
 
+def test_run_many(profile):
+    jobs = [
+        {'profile_name': profile.name, 'command': 'echo 1'},
+        {'profile_name': profile.name, 'command': 'cat', 'stdin': b'2'},
+        {'profile_name': profile.name, 'command': 'false'},
+    ]
+
+    results = run_many(jobs, max_workers=2)
+
+    assert [result['stdout'] for result in results] == [b'1\n', b'2', b'']
+    assert [result['exit_code'] for result in results] == [0, 0, 1]
+
+
+def test_run_many_unknown_profile(profile):
+    jobs = [
+        {'profile_name': profile.name, 'command': 'true'},
+        {'profile_name': 'unknown', 'command': 'true'},
+    ]
+
+    with pytest.raises(ValueError):
+        run_many(jobs)
+
+
 def test_run_reuse_workdir(profile, docker_client):
     with working_directory() as workdir:
         assert workdir.node is None
@@ -388,3 +414,29 @@ def test_write_files(docker_client, docker_image):
                           b'file.txt contentmain.py content')
     finally:
         container.remove(v=True, force=True)
+
+
+def test_add_tar_member_matches_addfile():
+    members = [
+        ('empty', b''),
+        ('short', b'x' * 100),
+        ('block', b'x' * tarfile.BLOCKSIZE),
+        ('blocks', b'x' * (2 * tarfile.BLOCKSIZE + 1)),
+        ('long' * 40, b'long name content'),
+    ]
+    expected_fileobj = io.BytesIO()
+    actual_fileobj = io.BytesIO()
+    with tarfile.open(fileobj=expected_fileobj, mode='w') as expected, \
+            tarfile.open(fileobj=actual_fileobj, mode='w') as actual:
+        for name, content in members:
+            file_info = tarfile.TarInfo(name=name)
+            file_info.size = len(content)
+            file_info.mtime = 1
+            expected.addfile(file_info, io.BytesIO(content))
+            _add_tar_member(actual, file_info, content)
+
+    assert actual_fileobj.getvalue() == expected_fileobj.getvalue()
+    actual_fileobj.seek(0)
+    with tarfile.open(fileobj=actual_fileobj) as tarball:
+        assert [(member.name, tarball.extractfile(member).read())
+                for member in tarball.getmembers()] == members
@@ -1,6 +1,10 @@
+import datetime
+
 import pytest
 
-from epicbox.utils import docker_communicate
+from epicbox import config as epicbox_config
+from epicbox.utils import (docker_communicate, merge_limits_defaults,
+                           parse_docker_datetime, truncate_result)
 
 
 def test_docker_communicate_empty_input_empty_output(test_utils):
@@ -75,3 +79,68 @@ def test_docker_communicate_timeout_reached(test_utils, docker_client):
 
     container.reload()
     assert container.status == 'running'
+
+
+def test_parse_docker_datetime():
+    utc = datetime.timezone.utc
+
+    assert (parse_docker_datetime('2018-11-10T12:34:56.123456789Z') ==
+            datetime.datetime(2018, 11, 10, 12, 34, 56, 123456, tzinfo=utc))
+    assert (parse_docker_datetime('2018-11-10T12:34:56.5Z') ==
+            datetime.datetime(2018, 11, 10, 12, 34, 56, 500000, tzinfo=utc))
+    assert (parse_docker_datetime('0001-01-01T00:00:00Z') ==
+            datetime.datetime(1, 1, 1, tzinfo=utc))
+    assert (parse_docker_datetime('2018-11-10T15:34:56+03:00') ==
+            datetime.datetime(2018, 11, 10, 12, 34, 56, tzinfo=utc))
+
+
+def test_parse_docker_datetime_invalid():
+    with pytest.raises(ValueError):
+        parse_docker_datetime('10 Nov 2018')
+
+
+def test_merge_limits_defaults():
+    limits = {'cputime': 2, 'memory': 128}
+
+    merged = merge_limits_defaults(limits)
+
+    realtime = 2 * epicbox_config.CPU_TO_REAL_TIME_FACTOR
+    assert merged == dict(epicbox_config.DEFAULT_LIMITS, cputime=2,
+                          memory=128, realtime=realtime)
+    assert limits == {'cputime': 2, 'memory': 128}
+    assert merge_limits_defaults(None) == epicbox_config.DEFAULT_LIMITS
+
+
+def test_merge_limits_defaults_result_mutation_does_not_leak():
+    merged = merge_limits_defaults({'cputime': 2})
+    merged['memory'] = 1
+    defaults = merge_limits_defaults(None)
+    defaults['memory'] = 1
+
+    assert merge_limits_defaults({'cputime': 2})['memory'] != 1
+    assert merge_limits_defaults(None)['memory'] != 1
+    assert epicbox_config.DEFAULT_LIMITS['memory'] != 1
+
+
+def test_merge_limits_defaults_realtime_specified():
+    merged = merge_limits_defaults({'cputime': 2, 'realtime': 3})
+
+    assert merged['realtime'] == 3
+
+
+def test_truncate_result_short_output():
+    result = {'exit_code': 0, 'stdout': b'out', 'stderr': b''}
+
+    assert truncate_result(result) is result
+
+
+def test_truncate_result_long_output():
+    result = {'exit_code': 0, 'stdout': b'x' * 101, 'stderr': b'err'}
+
+    truncated = truncate_result(result)
+
+    assert truncated is not result
+    assert truncated == {'exit_code': 0,
+                         'stdout': b'x' * 100 + b' *** truncated ***',
+                         'stderr': b'err'}
+    assert result['stdout'] == b'x' * 101